@@ -3,42 +3,53 @@ HIPAA-compliant FastAPI Agent Backend
 Connects to Ollama OSS LLM via private network
 """
 
-from fastapi import FastAPI, WebSocket, HTTPException, WebSocketDisconnect, Depends, Security
-from fastapi.responses import HTMLResponse, JSONResponse
+from fastapi import FastAPI, WebSocket, HTTPException, WebSocketDisconnect, Depends, Security, Request
+from fastapi.responses import ORJSONResponse, Response
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict
 import os
-import json
 import logging
 import asyncio
+import gzip
+import hashlib
+import hmac
+import orjson
+from collections import OrderedDict
+from contextlib import asynccontextmanager
 from typing import List, Dict, Optional
 from datetime import datetime
 from dotenv import load_dotenv
 
+try:
+    import redis.asyncio as aioredis
+except ImportError:
+    aioredis = None
+
 # Load environment variables from .env file
 load_dotenv()
 
-from providers.ollama import chat_ollama, check_ollama_health
+from providers.ollama import chat_ollama, check_ollama_health, close_client, EncodedHistory
 
-# API Key Authentication
+# API Key Authentication (read once at startup)
 security = HTTPBearer()
+API_KEY = os.getenv("API_KEY")
+ENVIRONMENT = os.getenv("ENVIRONMENT")
 
 async def verify_api_key(credentials: HTTPAuthorizationCredentials = Security(security)):
     """Verify API key for HIPAA compliance"""
-    api_key = os.getenv("API_KEY")
-    
     # Allow no auth in development mode
-    if os.getenv("ENVIRONMENT") == "development" and not api_key:
+    if ENVIRONMENT == "development" and not API_KEY:
         return credentials
     
     # Require API key in production
-    if not api_key:
+    if not API_KEY:
         logger.error("API_KEY not configured")
         raise HTTPException(status_code=500, detail="API authentication not configured")
     
-    if credentials.credentials != api_key:
-        logger.warning(f"Invalid API key attempt")
+    # Constant-time comparison to avoid leaking the key through timing
+    if not hmac.compare_digest(credentials.credentials.encode("utf-8"), API_KEY.encode("utf-8")):
+        logger.warning("Invalid API key attempt")
         raise HTTPException(status_code=403, detail="Invalid API Key")
     
     return credentials
@@ -54,16 +65,28 @@ logger = logging.getLogger(__name__)
 app = FastAPI(
     title="HIPAA-Compliant Agent Backend",
     description="OSS LLM Agent with PHI protection",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=ORJSONResponse
 )
 
-# CORS configuration for internal use only
+@app.on_event("shutdown")
+async def shutdown():
+    """Release pooled Ollama and Redis connections"""
+    await close_client()
+    if redis_client is not None:
+        await redis_client.aclose()
+
+# CORS configuration for internal use only: explicit origins so browsers can
+# cache preflight responses (the chat UI itself is same-origin)
+ALLOWED_ORIGINS = [o.strip() for o in os.getenv("ALLOWED_ORIGINS", "").split(",") if o.strip()]
+
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=["*"],  # Configure appropriately for production
+    allow_origins=ALLOWED_ORIGINS,
     allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
+    allow_methods=["GET", "POST"],
+    allow_headers=["Authorization", "Content-Type"],
+    max_age=86400,
 )
 
 # System prompt with HIPAA guidelines
@@ -88,20 +111,127 @@ You have access to these tools:
 2. file_search: Internal document search (safe for PHI)
 3. browser_action: Automated browser tasks (requires confirmation)"""
 
+# Shared by every conversation; treat as read-only
+SYSTEM_MESSAGE = {"role": "system", "content": SYSTEM_PROMPT}
+SYSTEM_MESSAGE_JSON = orjson.dumps(SYSTEM_MESSAGE)
+
 # Request/Response models
 class ChatRequest(BaseModel):
+    model_config = ConfigDict(extra="forbid")
+    
     message: str
     session_id: Optional[str] = None
     temperature: Optional[float] = 0.7
     max_tokens: Optional[int] = None
 
 class ChatResponse(BaseModel):
+    model_config = ConfigDict(extra="forbid")
+    
     reply: str
     session_id: Optional[str] = None
     timestamp: str
 
-# Session management (in-memory for now, use Redis in production)
-sessions = {}
+# Maximum number of queued chunks coalesced into a single WebSocket frame
+WS_MAX_BATCH = int(os.getenv("WS_MAX_BATCH", "64"))
+
+# Session management: Redis when REDIS_URL is set (required for multiple
+# workers), in-memory otherwise. Redis keeps each session as a list of
+# encoded messages, excluding the shared system prompt.
+REDIS_URL = os.getenv("REDIS_URL")
+SESSION_TTL = int(os.getenv("SESSION_TTL", "3600"))
+SESSION_KEY_PREFIX = "session:"
+MAX_SESSION_MESSAGES = 20
+SESSION_KEEP_MESSAGES = 10
+MAX_SESSIONS = int(os.getenv("MAX_SESSIONS", "1000"))
+
+# In-memory sessions are kept in LRU order and capped at MAX_SESSIONS
+sessions: "OrderedDict[str, EncodedHistory]" = OrderedDict()
+redis_client = None
+
+# Per-session [lock, users] entries, dropped once no request holds or awaits them
+_session_locks: Dict[str, list] = {}
+
+if REDIS_URL:
+    if aioredis is None:
+        logger.warning("REDIS_URL set but redis package not installed, using in-memory sessions")
+    else:
+        redis_client = aioredis.from_url(REDIS_URL)
+
+def new_history() -> EncodedHistory:
+    """Start a conversation with the system prompt"""
+    return EncodedHistory.from_encoded([SYSTEM_MESSAGE_JSON])
+
+@asynccontextmanager
+async def session_lock(session_id: str):
+    """Serialize read-modify-write of a single session's history"""
+    entry = _session_locks.get(session_id)
+    if entry is None:
+        entry = _session_locks[session_id] = [asyncio.Lock(), 0]
+    
+    entry[1] += 1
+    try:
+        async with entry[0]:
+            yield
+    finally:
+        entry[1] -= 1
+        if entry[1] == 0:
+            del _session_locks[session_id]
+
+async def load_session(session_id: str) -> Optional[EncodedHistory]:
+    """Load a session's message history, or None if it does not exist"""
+    if redis_client is None:
+        history = sessions.get(session_id)
+        if history is not None:
+            sessions.move_to_end(session_id)
+        return history
+    
+    encoded = await redis_client.lrange(SESSION_KEY_PREFIX + session_id, 0, -1)
+    if not encoded:
+        return None
+    return EncodedHistory.from_encoded([SYSTEM_MESSAGE_JSON, *encoded])
+
+async def save_session(session_id: str, history: EncodedHistory, new_messages: int) -> None:
+    """
+    Store a session's message history, refreshing its expiry
+    
+    Only the last `new_messages` entries are written to Redis; the history is
+    trimmed to the system prompt plus the most recent messages
+    """
+    trim = len(history) > MAX_SESSION_MESSAGES
+    
+    if redis_client is None:
+        if trim:
+            history.keep_recent(SESSION_KEEP_MESSAGES)
+        sessions[session_id] = history
+        sessions.move_to_end(session_id)
+        if len(sessions) > MAX_SESSIONS:
+            sessions.popitem(last=False)
+        return
+    
+    key = SESSION_KEY_PREFIX + session_id
+    pipe = redis_client.pipeline()
+    pipe.rpush(key, *history.encoded[-new_messages:])
+    if trim:
+        pipe.ltrim(key, -SESSION_KEEP_MESSAGES, -1)
+    pipe.expire(key, SESSION_TTL)
+    await pipe.execute()
+
+async def delete_session(session_id: str) -> bool:
+    """Delete a session, returning whether it existed"""
+    if redis_client is None:
+        return sessions.pop(session_id, None) is not None
+    
+    return await redis_client.delete(SESSION_KEY_PREFIX + session_id) > 0
+
+async def clear_sessions() -> None:
+    """Delete all sessions"""
+    if redis_client is None:
+        sessions.clear()
+        return
+    
+    keys = [key async for key in redis_client.scan_iter(match=SESSION_KEY_PREFIX + "*")]
+    if keys:
+        await redis_client.delete(*keys)
 
 # Minimal chat UI for testing
 HTML_TEMPLATE = """
@@ -322,24 +452,69 @@ HTML_TEMPLATE = """
 </html>
 """
 
+# The chat UI is static, so encode, compress and tag it once at import
+_HTML_BYTES = HTML_TEMPLATE.encode("utf-8")
+_HTML_ETAG = '"' + hashlib.blake2b(_HTML_BYTES, digest_size=8).hexdigest() + '"'
+_HTML_GZ = gzip.compress(_HTML_BYTES, compresslevel=9)
+_HTML_GZ_ETAG = _HTML_ETAG[:-1] + '-gz"'
+
 @app.get("/")
-async def home():
+async def home(request: Request):
     """Serve the chat interface"""
-    return HTMLResponse(HTML_TEMPLATE)
+    if "gzip" in request.headers.get("accept-encoding", ""):
+        content, etag = _HTML_GZ, _HTML_GZ_ETAG
+        headers = {"Content-Encoding": "gzip"}
+    else:
+        content, etag = _HTML_BYTES, _HTML_ETAG
+        headers = {}
+    
+    headers.update({"ETag": etag, "Cache-Control": "no-cache", "Vary": "Accept-Encoding"})
+    
+    if request.headers.get("if-none-match") == etag:
+        headers.pop("Content-Encoding", None)
+        return Response(status_code=304, headers=headers)
+    
+    return Response(content=content, media_type="text/html", headers=headers)
 
 @app.get("/health")
 async def health_check():
     """Health check endpoint"""
-    ollama_health = check_ollama_health()
+    ollama_health = await check_ollama_health()
     
-    return JSONResponse({
+    return {
         "status": "healthy" if ollama_health["healthy"] else "degraded",
         "timestamp": datetime.utcnow().isoformat(),
         "services": {
             "backend": "healthy",
             "ollama": ollama_health
         }
-    })
+    }
+
+async def _drain_to_websocket(queue: asyncio.Queue, websocket: WebSocket):
+    """
+    Send queued chunks to the client, coalescing whatever is already waiting
+    into a single frame. A None sentinel flushes and stops the writer.
+    """
+    while True:
+        chunk = await queue.get()
+        if chunk is None:
+            return
+        
+        buffer = [chunk]
+        done = False
+        while len(buffer) < WS_MAX_BATCH:
+            try:
+                chunk = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                break
+            if chunk is None:
+                done = True
+                break
+            buffer.append(chunk)
+        
+        await websocket.send_text("".join(buffer))
+        if done:
+            return
 
 @app.websocket("/ws")
 async def websocket_endpoint(websocket: WebSocket):
@@ -347,10 +522,10 @@ async def websocket_endpoint(websocket: WebSocket):
     await websocket.accept()
     
     # Initialize conversation with system prompt
-    messages = [{"role": "system", "content": SYSTEM_PROMPT}]
+    messages = new_history()
     
     # Log connection (no PHI)
-    logger.info(f"WebSocket connection established")
+    logger.info("WebSocket connection established")
     
     try:
         while True:
@@ -358,35 +533,46 @@ async def websocket_endpoint(websocket: WebSocket):
             user_message = await websocket.receive_text()
             
             # Log metadata only
-            logger.info(f"Received message, length={len(user_message)}")
+            logger.info("Received message, length=%d", len(user_message))
             
             # Add user message to conversation
             messages.append({"role": "user", "content": user_message})
             
             # Stream response from Ollama
-            assistant_message = ""
+            parts: List[str] = []
+            queue: asyncio.Queue = asyncio.Queue()
+            writer = asyncio.create_task(_drain_to_websocket(queue, websocket))
             try:
-                for chunk in chat_ollama(messages, stream=True):
-                    assistant_message += chunk
-                    await websocket.send_text(chunk)
+                try:
+                    async for chunk in chat_ollama(messages, stream=True):
+                        if writer.done():
+                            # Writer failed (e.g. client went away), stop producing
+                            break
+                        parts.append(chunk)
+                        await queue.put(chunk)
+                finally:
+                    # Flush remaining chunks before the completion indicator
+                    await queue.put(None)
+                    await writer
                 
                 # Send completion indicator
                 await websocket.send_text("\n")
                 
                 # Add assistant response to conversation history
+                assistant_message = "".join(parts)
                 messages.append({"role": "assistant", "content": assistant_message})
                 
                 # Log completion (no content)
-                logger.info(f"Response completed, length={len(assistant_message)}")
+                logger.info("Response completed, length=%d", len(assistant_message))
                 
             except Exception as e:
-                logger.error(f"Error generating response: {type(e).__name__}")
+                logger.error("Error generating response: %s", type(e).__name__)
                 await websocket.send_text("\n[Error: Unable to generate response. Please try again.]\n")
                 
     except WebSocketDisconnect:
         logger.info("WebSocket connection closed")
     except Exception as e:
-        logger.error(f"WebSocket error: {type(e).__name__}")
+        logger.error("WebSocket error: %s", type(e).__name__)
         await websocket.close()
 
 @app.post("/chat", response_model=ChatResponse, dependencies=[Depends(verify_api_key)])
@@ -394,37 +580,36 @@ async def chat(request: ChatRequest):
     """REST endpoint for single-turn chat"""
     
     # Log request metadata only
-    logger.info(f"Chat request received, session={request.session_id}")
+    logger.info("Chat request received, session=%s", request.session_id)
     
     # Get or create session
     session_id = request.session_id or f"session_{datetime.utcnow().timestamp()}"
     
-    if session_id not in sessions:
-        sessions[session_id] = [{"role": "system", "content": SYSTEM_PROMPT}]
-    
-    messages = sessions[session_id]
-    messages.append({"role": "user", "content": request.message})
-    
     try:
-        # Get response from Ollama
-        response_chunks = []
-        for chunk in chat_ollama(
-            messages, 
-            stream=True,
-            temperature=request.temperature,
-            max_tokens=request.max_tokens
-        ):
-            response_chunks.append(chunk)
-        
-        assistant_response = "".join(response_chunks)
-        
-        # Update session
-        messages.append({"role": "assistant", "content": assistant_response})
-        
-        # Limit session history to prevent memory issues
-        if len(messages) > 20:
-            messages = [messages[0]] + messages[-10:]  # Keep system prompt + last 10
-            sessions[session_id] = messages
+        # Hold the session lock across read-modify-write so concurrent
+        # requests for one session cannot interleave their turns
+        async with session_lock(session_id):
+            messages = await load_session(session_id)
+            if messages is None:
+                messages = new_history()
+            
+            messages.append({"role": "user", "content": request.message})
+            
+            # Get response from Ollama
+            response_chunks = []
+            async for chunk in chat_ollama(
+                messages, 
+                stream=True,
+                temperature=request.temperature,
+                max_tokens=request.max_tokens
+            ):
+                response_chunks.append(chunk)
+            
+            assistant_response = "".join(response_chunks)
+            
+            # Update session (history is trimmed to prevent memory issues)
+            messages.append({"role": "assistant", "content": assistant_response})
+            await save_session(session_id, messages, new_messages=2)
         
         return ChatResponse(
             reply=assistant_response,
@@ -433,64 +618,81 @@ async def chat(request: ChatRequest):
         )
         
     except Exception as e:
-        logger.error(f"Chat error: {type(e).__name__}")
+        logger.error("Chat error: %s", type(e).__name__)
         raise HTTPException(status_code=500, detail="Failed to generate response")
 
 @app.post("/clear-session")
 async def clear_session(session_id: Optional[str] = None):
     """Clear a specific session or all sessions"""
     if session_id:
-        if session_id in sessions:
-            del sessions[session_id]
-            logger.info(f"Session cleared: {session_id}")
+        if await delete_session(session_id):
+            logger.info("Session cleared: %s", session_id)
             return {"message": "Session cleared", "session_id": session_id}
         else:
             raise HTTPException(status_code=404, detail="Session not found")
     else:
-        sessions.clear()
+        await clear_sessions()
         logger.info("All sessions cleared")
         return {"message": "All sessions cleared"}
 
-# Tool endpoints (to be integrated with tool implementations)
+# Tool implementations, resolved once at startup
+try:
+    from tools.web_search import search_with_phi_protection
+except ImportError:
+    search_with_phi_protection = None
+
+try:
+    from tools.file_search import search_internal_documents
+except ImportError:
+    search_internal_documents = None
+
+try:
+    from tools.browser_action import execute_browser_action
+except ImportError:
+    execute_browser_action = None
+
+# Tool endpoints
 @app.post("/tools/web-search")
 async def web_search_endpoint(query: str):
     """Web search with PHI redaction"""
-    # Import tool when available
-    try:
-        from tools.web_search import search_with_phi_protection
-        results = await search_with_phi_protection(query)
-        return JSONResponse(results)
-    except ImportError:
-        return JSONResponse({
+    if search_with_phi_protection is None:
+        return ORJSONResponse({
             "error": "Web search tool not yet implemented",
             "query": query
-        })
+        }, status_code=501)
+    
+    return await search_with_phi_protection(query)
 
 @app.post("/tools/file-search")
 async def file_search_endpoint(query: str):
     """Internal file search (PHI-safe)"""
-    try:
-        from tools.file_search import search_internal_documents
-        results = await search_internal_documents(query)
-        return JSONResponse(results)
-    except ImportError:
-        return JSONResponse({
+    if search_internal_documents is None:
+        return ORJSONResponse({
             "error": "File search tool not yet implemented",
             "query": query
-        })
+        }, status_code=501)
+    
+    return await search_internal_documents(query)
 
 @app.post("/tools/browser-action")
-async def browser_action_endpoint(action: Dict):
+async def browser_action_endpoint(request: Request):
     """Browser automation with confirmation"""
+    # Parse the action plan straight from the body bytes with orjson
     try:
-        from tools.browser_action import execute_browser_action
-        results = await execute_browser_action(action)
-        return JSONResponse(results)
-    except ImportError:
-        return JSONResponse({
+        action = orjson.loads(await request.body())
+    except orjson.JSONDecodeError:
+        return ORJSONResponse({"detail": "Invalid JSON body"}, status_code=422)
+    if not isinstance(action, dict):
+        return ORJSONResponse({"detail": "Body must be a JSON object"}, status_code=422)
+    
+    if execute_browser_action is None:
+        return ORJSONResponse({
             "error": "Browser action tool not yet implemented",
             "action": action
-        })
+        }, status_code=501)
+    
+    # Plans hold only plain JSON types, so skip jsonable_encoder
+    return ORJSONResponse(await execute_browser_action(action))
 
 if __name__ == "__main__":
     import uvicorn
@@ -498,11 +700,18 @@ if __name__ == "__main__":
     # Get port from environment or use default
     port = int(os.getenv("PORT", "8000"))
     
-    # Run with production settings
+    # Run with production settings on uvloop + httptools (from uvicorn[standard]).
+    # WORKERS > 1 requires REDIS_URL so sessions are shared between processes.
     uvicorn.run(
         "app:app",
         host="0.0.0.0",
         port=port,
         log_level="info",
-        access_log=False  # Disable access logs to prevent PHI exposure
+        access_log=False,  # Disable access logs to prevent PHI exposure
+        loop="uvloop",
+        http="httptools",
+        workers=int(os.getenv("WORKERS", "1")),
+        # Token frames are a few bytes each; compressing them only adds
+        # per-frame latency. TCP_NODELAY is already set by uvloop/asyncio.
+        ws_per_message_deflate=os.getenv("WS_PER_MESSAGE_DEFLATE", "false").lower() == "true"
     )
\ No newline at end of file
@@ -4,13 +4,14 @@ Ensures PHI stays within private network boundary
 """
 
 import os
-import json
-import requests
+import time
+import asyncio
+import httpx
+import orjson
 import logging
-from typing import List, Dict, Iterator, Optional, Union
+from typing import List, Dict, AsyncIterator, Iterable, Optional, Union
 
-# Configure logging to avoid PHI exposure
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+# Logging is configured by the application; never log PHI from this module
 logger = logging.getLogger(__name__)
 
 # Environment configuration with secure defaults
@@ -18,6 +19,16 @@ OLLAMA_URL = os.getenv("OLLAMA_URL", "http://localhost:11434/api/chat")
 OLLAMA_MODEL = os.getenv("OLLAMA_MODEL", "gpt-oss:20b")
 TIMEOUT = int(os.getenv("OLLAMA_TIMEOUT", "600"))
 MAX_RETRIES = int(os.getenv("OLLAMA_MAX_RETRIES", "3"))
+RETRY_BACKOFF = float(os.getenv("OLLAMA_RETRY_BACKOFF", "0.5"))
+HEALTH_CACHE_TTL = float(os.getenv("OLLAMA_HEALTH_CACHE_TTL", "2"))
+STREAM_CHUNK_SIZE = 128 * 1024
+MAX_STREAM_LINE = 1024 * 1024
+
+# Shared async client so chat and health calls reuse one keepalive connection pool
+_client = httpx.AsyncClient(
+    timeout=httpx.Timeout(TIMEOUT),
+    limits=httpx.Limits(max_keepalive_connections=64)
+)
 
 def sanitize_for_logging(text: str, max_length: int = 100) -> str:
     """
@@ -32,35 +43,71 @@ def sanitize_for_logging(text: str, max_length: int = 100) -> str:
         return f"{text[:max_length]}... [truncated]"
     return text
 
-def chat_ollama(
-    messages: List[Dict[str, str]], 
+class EncodedHistory:
+    """
+    Conversation history kept as one pre-serialized JSON object per message
+    
+    Each message is encoded once when appended, so a request body for a long
+    conversation is assembled by joining bytes instead of re-serializing the
+    whole history every turn
+    """
+    
+    def __init__(self, messages: Iterable[Dict[str, str]] = ()):
+        self._encoded: List[bytes] = [orjson.dumps(m) for m in messages]
+    
+    @classmethod
+    def from_encoded(cls, encoded: Iterable[bytes]) -> "EncodedHistory":
+        """Build a history from already-serialized messages"""
+        history = cls()
+        history._encoded = list(encoded)
+        return history
+    
+    def append(self, message: Dict[str, str]) -> None:
+        self._encoded.append(orjson.dumps(message))
+    
+    def keep_recent(self, count: int) -> None:
+        """Drop all but the first (system) message and the last `count` messages"""
+        self._encoded = self._encoded[:1] + self._encoded[-count:]
+    
+    @property
+    def encoded(self) -> List[bytes]:
+        return self._encoded
+    
+    def to_json(self) -> bytes:
+        return b"[" + b",".join(self._encoded) + b"]"
+    
+    def __len__(self) -> int:
+        return len(self._encoded)
+
+async def chat_ollama(
+    messages: Union[List[Dict[str, str]], EncodedHistory], 
     stream: bool = True,
     temperature: float = 0.7,
     max_tokens: Optional[int] = None
-) -> Union[Iterator[str], str]:
+) -> AsyncIterator[str]:
     """
     Send chat messages to Ollama and receive response
     
     Args:
-        messages: List of message dicts with 'role' and 'content'
+        messages: List of message dicts with 'role' and 'content', or an
+            EncodedHistory of them
         stream: Whether to stream the response
         temperature: Model temperature (0.0-1.0)
         max_tokens: Maximum tokens to generate
     
-    Returns:
-        Iterator of text chunks if streaming, full text otherwise
+    Yields:
+        Text chunks if streaming, the full text as a single chunk otherwise
     
     Raises:
-        requests.RequestException: On network errors
+        httpx.HTTPError: On network errors
         ValueError: On invalid response format
     """
     
     # Log metadata only, never log message content
-    logger.info(f"Ollama chat request: model={OLLAMA_MODEL}, stream={stream}, messages_count={len(messages)}")
+    logger.info("Ollama chat request: model=%s, stream=%s, messages_count=%d", OLLAMA_MODEL, stream, len(messages))
     
     payload = {
         "model": OLLAMA_MODEL,
-        "messages": messages,
         "stream": stream,
         "options": {
             "temperature": temperature,
@@ -70,53 +117,77 @@ def chat_ollama(
     if max_tokens:
         payload["options"]["num_predict"] = max_tokens
     
+    if isinstance(messages, EncodedHistory):
+        encoded_messages = messages.to_json()
+    else:
+        encoded_messages = orjson.dumps(messages)
+    
+    # Serialize once up front, splicing the messages array into the small
+    # request envelope; retries resend the same bytes
+    body = orjson.dumps(payload)[:-1] + b',"messages":' + encoded_messages + b"}"
+    
     retry_count = 0
     last_error = None
     
     while retry_count < MAX_RETRIES:
+        # Only retry while nothing has been yielded, otherwise the caller
+        # would see duplicated output
+        started = False
         try:
-            response = requests.post(
+            async with _client.stream(
+                "POST",
                 OLLAMA_URL,
-                json=payload,
-                stream=stream,
-                timeout=TIMEOUT
-            )
-            response.raise_for_status()
-            
-            if stream:
-                return _handle_stream_response(response)
-            else:
-                return _handle_single_response(response)
+                content=body,
+                headers={"Content-Type": "application/json"}
+            ) as response:
+                response.raise_for_status()
+                
+                if stream:
+                    async for content in _handle_stream_response(response):
+                        started = True
+                        yield content
+                else:
+                    await response.aread()
+                    started = True
+                    yield _handle_single_response(response)
+            return
                 
-        except requests.exceptions.Timeout:
+        except httpx.TimeoutException:
+            if started:
+                raise
             retry_count += 1
             last_error = f"Request timeout after {TIMEOUT}s (attempt {retry_count}/{MAX_RETRIES})"
             logger.warning(last_error)
             
-        except requests.exceptions.RequestException as e:
+        except httpx.HTTPError as e:
+            if started:
+                raise
             retry_count += 1
             last_error = f"Request failed: {type(e).__name__} (attempt {retry_count}/{MAX_RETRIES})"
             logger.error(last_error)
             
         except Exception as e:
             # Unexpected error, don't retry
-            logger.error(f"Unexpected error in chat_ollama: {type(e).__name__}")
+            logger.error("Unexpected error in chat_ollama: %s", type(e).__name__)
             raise
+        
+        if retry_count < MAX_RETRIES:
+            await asyncio.sleep(RETRY_BACKOFF * 2 ** (retry_count - 1))
     
     # All retries exhausted
-    raise requests.RequestException(f"Failed after {MAX_RETRIES} attempts. Last error: {last_error}")
+    raise httpx.RequestError(f"Failed after {MAX_RETRIES} attempts. Last error: {last_error}")
 
-def _handle_stream_response(response: requests.Response) -> Iterator[str]:
+async def _handle_stream_response(response: httpx.Response) -> AsyncIterator[str]:
     """
     Handle streaming response from Ollama
     """
     try:
-        for line in response.iter_lines():
+        async for line in _aiter_raw_lines(response):
             if not line:
                 continue
             
             try:
-                data = json.loads(line.decode("utf-8"))
+                data = orjson.loads(line)
                 
                 # Check for completion
                 if data.get("done", False):
@@ -128,46 +199,92 @@ def _handle_stream_response(response: requests.Response) -> Iterator[str]:
                 if content:
                     yield content
                     
-            except json.JSONDecodeError:
+            except orjson.JSONDecodeError:
                 # Skip non-JSON lines (keepalive, etc)
                 continue
                 
     except Exception as e:
-        logger.error(f"Error processing stream: {type(e).__name__}")
+        logger.error("Error processing stream: %s", type(e).__name__)
         raise
 
-def _handle_single_response(response: requests.Response) -> str:
+async def _aiter_raw_lines(response: httpx.Response) -> AsyncIterator[bytes]:
+    """
+    Split a streamed body into lines without decoding it to str first;
+    orjson parses the bytes directly. A line longer than MAX_STREAM_LINE
+    aborts the stream so a misbehaving upstream cannot grow the buffer
+    without bound.
+    """
+    buffer = bytearray()
+    async for raw in response.aiter_bytes(STREAM_CHUNK_SIZE):
+        buffer += raw
+        start = 0
+        while (end := buffer.find(b"\n", start)) != -1:
+            yield buffer[start:end]
+            start = end + 1
+        del buffer[:start]
+        
+        if len(buffer) > MAX_STREAM_LINE:
+            raise ValueError(f"Stream line exceeds {MAX_STREAM_LINE} bytes")
+    
+    if buffer:
+        yield bytes(buffer)
+
+def _handle_single_response(response: httpx.Response) -> str:
     """
     Handle non-streaming response from Ollama
     """
     try:
-        data = response.json()
+        data = orjson.loads(response.content)
         
         if "message" not in data or "content" not in data["message"]:
             raise ValueError("Invalid response format from Ollama")
         
         content = data["message"]["content"]
-        logger.info(f"Single response received, length={len(content)}")
+        logger.info("Single response received, length=%d", len(content))
         return content
         
-    except json.JSONDecodeError as e:
+    except orjson.JSONDecodeError as e:
         logger.error("Failed to parse JSON response from Ollama")
         raise ValueError(f"Invalid JSON response: {e}")
 
-def check_ollama_health() -> Dict[str, any]:
+# Last health result, shared by all callers for HEALTH_CACHE_TTL seconds
+_health_cache = {"ts": 0.0, "val": None}
+_health_lock = asyncio.Lock()
+
+async def check_ollama_health() -> Dict[str, any]:
     """
     Check if Ollama service is healthy and model is available
     
+    Results are cached briefly and refreshed by a single caller at a time,
+    so frequent health probes collapse into one upstream request
+    
     Returns:
         Dict with health status and available models
     """
+    if _health_cache["val"] is not None and time.monotonic() - _health_cache["ts"] < HEALTH_CACHE_TTL:
+        return _health_cache["val"]
+    
+    async with _health_lock:
+        # Another caller may have refreshed the cache while we waited
+        if _health_cache["val"] is not None and time.monotonic() - _health_cache["ts"] < HEALTH_CACHE_TTL:
+            return _health_cache["val"]
+        
+        health_status = await _fetch_ollama_health()
+        _health_cache["ts"] = time.monotonic()
+        _health_cache["val"] = health_status
+        return health_status
+
+async def _fetch_ollama_health() -> Dict[str, any]:
+    """
+    Query Ollama for its available models
+    """
     try:
         # Check service health
         health_url = OLLAMA_URL.replace("/api/chat", "/api/tags")
-        response = requests.get(health_url, timeout=10)
+        response = await _client.get(health_url, timeout=10)
         response.raise_for_status()
         
-        data = response.json()
+        data = orjson.loads(response.content)
         models = [m.get("name", "unknown") for m in data.get("models", [])]
         
         health_status = {
@@ -177,11 +294,11 @@ def check_ollama_health() -> Dict[str, any]:
             "model_available": OLLAMA_MODEL in models
         }
         
-        logger.info(f"Ollama health check: {health_status}")
+        logger.info("Ollama health check: %s", health_status)
         return health_status
         
     except Exception as e:
-        logger.error(f"Ollama health check failed: {type(e).__name__}")
+        logger.error("Ollama health check failed: %s", type(e).__name__)
         return {
             "healthy": False,
             "error": str(type(e).__name__),
@@ -190,14 +307,20 @@ def check_ollama_health() -> Dict[str, any]:
             "model_available": False
         }
 
+async def close_client() -> None:
+    """
+    Close the shared HTTP client, releasing pooled connections
+    """
+    await _client.aclose()
+
 def format_tool_response(tool_name: str, tool_output: Dict) -> Dict[str, str]:
     """
     Format tool output as a message for the model
     Ensures PHI is not exposed in logs
     """
-    logger.info(f"Formatting tool response: tool={tool_name}")
+    logger.info("Formatting tool response: tool=%s", tool_name)
     
     return {
         "role": "tool",
-        "content": json.dumps(tool_output, ensure_ascii=False)
+        "content": orjson.dumps(tool_output).decode("utf-8")
     }
\ No newline at end of file
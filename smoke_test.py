@@ -5,42 +5,56 @@ Tests all endpoints and verifies PHI protection
 """
 
 import asyncio
-import json
 import sys
 import os
+import select
+from dataclasses import dataclass
 from datetime import datetime
 from typing import Dict, List
+import httpx
+import orjson
 import requests
+from requests.adapters import HTTPAdapter
 import websocket
 import threading
-import time
+from concurrent.futures import ThreadPoolExecutor
 
 # Configuration
 BASE_URL = os.getenv("AGENT_BACKEND_URL", "http://localhost:8000")
 WS_URL = BASE_URL.replace("http://", "ws://").replace("https://", "wss://")
 
-# Test results collector
-test_results = []
+# Shared HTTP session so every test reuses keep-alive connections
+SESSION = requests.Session()
+SESSION.mount("http://", HTTPAdapter(pool_connections=4, pool_maxsize=16, max_retries=0))
+SESSION.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=16, max_retries=0))
+
+@dataclass(slots=True)
+class SmokeResult:
+    """Single smoke test outcome"""
+    test: str
+    passed: bool
+    details: str
+    timestamp: datetime
+
+# Test results collector (appended to from worker threads)
+test_results: List[SmokeResult] = []
+test_results_lock = threading.Lock()
 
 def log_test(test_name: str, passed: bool, details: str = ""):
     """Log test result"""
-    result = {
-        "test": test_name,
-        "passed": passed,
-        "details": details,
-        "timestamp": datetime.utcnow().isoformat()
-    }
-    test_results.append(result)
-    
+    result = SmokeResult(test_name, passed, details, datetime.utcnow())
     status = "✅ PASS" if passed else "❌ FAIL"
-    print(f"{status} | {test_name}")
-    if details:
-        print(f"       Details: {details}")
+    
+    with test_results_lock:
+        test_results.append(result)
+        print(f"{status} | {test_name}")
+        if details:
+            print(f"       Details: {details}")
 
 def test_health_endpoint():
     """Test 1: Health check endpoint"""
     try:
-        response = requests.get(f"{BASE_URL}/health", timeout=10)
+        response = SESSION.get(f"{BASE_URL}/health", timeout=10)
         data = response.json()
         
         # Check backend health
@@ -70,7 +84,7 @@ def test_basic_chat():
             "temperature": 0.1
         }
         
-        response = requests.post(f"{BASE_URL}/chat", json=payload, timeout=30)
+        response = SESSION.post(f"{BASE_URL}/chat", json=payload, timeout=30)
         
         if response.status_code == 200:
             data = response.json()
@@ -95,22 +109,32 @@ def test_websocket_connection():
         # Send test message
         ws.send("What is 2+2? Reply with just the number.")
         
-        # Collect response
-        response_parts = []
-        timeout_start = time.time()
+        # Collect response; the socket enforces a 10 second timeout per read
+        ws.settimeout(10.0)
+        response_parts: List[bytes] = []
+        done = False
         
-        while time.time() - timeout_start < 10:  # 10 second timeout
+        while not done:
             try:
-                data = ws.recv_frame().data.decode('utf-8')
-                if data == "\n" or data == "[DONE]":
+                # Block for one frame, then drain any frames already waiting
+                frames = [ws.recv_frame().data]
+                while select.select([ws.sock], [], [], 0)[0]:
+                    frames.append(ws.recv_frame().data)
+            except websocket.WebSocketTimeoutException:
+                break
+            except (websocket.WebSocketException, OSError):
+                # Connection closed mid-stream
+                break
+            
+            for data in frames:
+                if data == b"\n" or data == b"[DONE]":
+                    done = True
                     break
                 response_parts.append(data)
-            except:
-                break
         
         ws.close()
         
-        full_response = "".join(response_parts)
+        full_response = b"".join(response_parts).decode('utf-8')
         if "4" in full_response:
             log_test("WebSocket Stream", True, f"Received {len(response_parts)} chunks")
         else:
@@ -127,7 +151,7 @@ def test_phi_redaction():
             "query": "Find information about John Doe, SSN 123-45-6789, born 01/15/1980, living at 123 Main St"
         }
         
-        response = requests.post(f"{BASE_URL}/tools/web-search", params=payload, timeout=10)
+        response = SESSION.post(f"{BASE_URL}/tools/web-search", params=payload, timeout=10)
         data = response.json()
         
         # Check if PHI was redacted
@@ -152,6 +176,32 @@ def test_phi_redaction():
     except Exception as e:
         log_test("PHI Redaction", False, str(e))
 
+def test_phi_redaction_separators():
+    """Test 4b: PHI joined by ASCII separator characters is still redacted"""
+    # Python's \s treats \x1c-\x1f as whitespace; these must not slip past
+    # any fast-path prefilter in front of the redaction regex
+    cases = {
+        "Dr.\x1cSmith visited": "Smith",
+        "123\x1fMain Street": "Main Street",
+    }
+    try:
+        exposed = []
+        for query, phi in cases.items():
+            response = SESSION.post(f"{BASE_URL}/tools/web-search", params={"query": query}, timeout=10)
+            data = response.json()
+            if "query" not in data:
+                log_test("PHI Redaction (separators)", True, "Web search tool not yet implemented (expected)")
+                return
+            if phi in data["query"]:
+                exposed.append(repr(query))
+        
+        if exposed:
+            log_test("PHI Redaction (separators)", False, f"PHI exposed for: {', '.join(exposed)}")
+        else:
+            log_test("PHI Redaction (separators)", True, "PHI redacted across separator characters")
+    except Exception as e:
+        log_test("PHI Redaction (separators)", False, str(e))
+
 def test_file_search():
     """Test 5: Internal file search (PHI-safe)"""
     try:
@@ -159,7 +209,7 @@ def test_file_search():
             "query": "HIPAA compliance guidelines"
         }
         
-        response = requests.post(f"{BASE_URL}/tools/file-search", params=payload, timeout=10)
+        response = SESSION.post(f"{BASE_URL}/tools/file-search", params=payload, timeout=10)
         data = response.json()
         
         if "error" in data:
@@ -188,7 +238,7 @@ def test_browser_action_confirmation():
             }
         }
         
-        response = requests.post(f"{BASE_URL}/tools/browser-action", json=payload, timeout=10)
+        response = SESSION.post(f"{BASE_URL}/tools/browser-action", json=payload, timeout=10)
         data = response.json()
         
         if "error" in data:
@@ -209,7 +259,7 @@ def test_session_management():
     try:
         # Create session with first message
         payload1 = {"message": "Remember this number: 42", "session_id": "test_session_001"}
-        response1 = requests.post(f"{BASE_URL}/chat", json=payload1, timeout=30)
+        response1 = SESSION.post(f"{BASE_URL}/chat", json=payload1, timeout=30)
         
         if response1.status_code != 200:
             log_test("Session Management", False, "Failed to create session")
@@ -217,7 +267,7 @@ def test_session_management():
         
         # Follow up in same session
         payload2 = {"message": "What number did I tell you?", "session_id": "test_session_001"}
-        response2 = requests.post(f"{BASE_URL}/chat", json=payload2, timeout=30)
+        response2 = SESSION.post(f"{BASE_URL}/chat", json=payload2, timeout=30)
         
         if response2.status_code == 200:
             reply = response2.json().get("reply", "")
@@ -227,35 +277,31 @@ def test_session_management():
                 log_test("Session Management", False, "Session context lost")
         
         # Clean up session
-        requests.post(f"{BASE_URL}/clear-session", params={"session_id": "test_session_001"})
+        SESSION.post(f"{BASE_URL}/clear-session", params={"session_id": "test_session_001"})
         
     except Exception as e:
         log_test("Session Management", False, str(e))
 
+async def _rate_limit_burst(count: int = 10) -> list:
+    """Fire `count` chat requests concurrently"""
+    async with httpx.AsyncClient(base_url=BASE_URL, timeout=5) as client:
+        return await asyncio.gather(
+            *[client.post("/chat", json={"message": f"Test {i}"}) for i in range(count)],
+            return_exceptions=True
+        )
+
 def test_rate_limiting():
     """Test 8: Rate limiting (if enabled)"""
     try:
-        # Send rapid requests
-        success_count = 0
-        rate_limited = False
+        # Send a concurrent burst so the limiter actually sees it
+        responses = asyncio.run(_rate_limit_burst())
+        status_codes = [r.status_code for r in responses if isinstance(r, httpx.Response)]
         
-        for i in range(10):
-            response = requests.post(
-                f"{BASE_URL}/chat",
-                json={"message": f"Test {i}"},
-                timeout=5
-            )
-            
-            if response.status_code == 200:
-                success_count += 1
-            elif response.status_code == 429:  # Too Many Requests
-                rate_limited = True
-                break
-            
-            time.sleep(0.1)  # Small delay
+        success_count = sum(1 for code in status_codes if code == 200)
+        rate_limited = any(code == 429 for code in status_codes)  # Too Many Requests
         
         # Rate limiting is good for security
-        if rate_limited or success_count == 10:
+        if rate_limited or success_count == len(responses):
             log_test("Rate Limiting", True, f"Handled {success_count} requests appropriately")
         else:
             log_test("Rate Limiting", False, "Unexpected behavior")
@@ -272,7 +318,7 @@ def test_error_handling():
             "temperature": "invalid"  # Invalid type
         }
         
-        response = requests.post(f"{BASE_URL}/chat", json=payload, timeout=10)
+        response = SESSION.post(f"{BASE_URL}/chat", json=payload, timeout=10)
         
         if response.status_code >= 400:
             # Check error doesn't expose sensitive info
@@ -295,7 +341,7 @@ def test_audit_logging():
     try:
         # Make a request that should be logged
         payload = {"message": "Test audit log entry"}
-        response = requests.post(f"{BASE_URL}/chat", json=payload, timeout=30)
+        response = SESSION.post(f"{BASE_URL}/chat", json=payload, timeout=30)
         
         if response.status_code == 200:
             log_test("Audit Logging", True, "Request processed (check logs for audit entry)")
@@ -312,7 +358,7 @@ def print_summary():
     print("="*60)
     
     total = len(test_results)
-    passed = sum(1 for r in test_results if r["passed"])
+    passed = sum(1 for r in test_results if r.passed)
     failed = total - passed
     
     print(f"\nTotal Tests: {total}")
@@ -323,27 +369,41 @@ def print_summary():
     if failed > 0:
         print("\nFailed Tests:")
         for result in test_results:
-            if not result["passed"]:
-                print(f"  - {result['test']}: {result['details']}")
+            if not result.passed:
+                print(f"  - {result.test}: {result.details}")
     
     print("\n" + "="*60)
     
     # Save results to file
-    with open("smoke_test_results.json", "w") as f:
-        json.dump({
-            "timestamp": datetime.utcnow().isoformat(),
+    # orjson serializes the SmokeResult dataclasses and datetimes natively
+    with open("smoke_test_results.json", "wb") as f:
+        f.write(orjson.dumps({
+            "timestamp": datetime.utcnow(),
             "summary": {
                 "total": total,
                 "passed": passed,
                 "failed": failed
             },
             "results": test_results
-        }, f, indent=2)
+        }, option=orjson.OPT_INDENT_2 | orjson.OPT_NAIVE_UTC))
     
     print("Results saved to smoke_test_results.json")
     
     return failed == 0
 
+# Tests with no shared server state, safe to run concurrently
+INDEPENDENT_TESTS = [
+    test_health_endpoint,
+    test_basic_chat,
+    test_websocket_connection,
+    test_phi_redaction,
+    test_phi_redaction_separators,
+    test_file_search,
+    test_browser_action_confirmation,
+    test_error_handling,
+    test_audit_logging,
+]
+
 def main():
     """Run all smoke tests"""
     print("="*60)
@@ -352,35 +412,14 @@ def main():
     print(f"Time: {datetime.utcnow().isoformat()}")
     print("="*60 + "\n")
     
-    # Run tests in order
-    test_health_endpoint()
-    time.sleep(1)
-    
-    test_basic_chat()
-    time.sleep(1)
-    
-    test_websocket_connection()
-    time.sleep(1)
-    
-    test_phi_redaction()
-    time.sleep(1)
-    
-    test_file_search()
-    time.sleep(1)
-    
-    test_browser_action_confirmation()
-    time.sleep(1)
+    # Independent tests overlap their network waits
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        for future in [executor.submit(test) for test in INDEPENDENT_TESTS]:
+            future.result()
     
+    # These depend on ordering or on request volume, so run them alone
     test_session_management()
-    time.sleep(1)
-    
     test_rate_limiting()
-    time.sleep(1)
-    
-    test_error_handling()
-    time.sleep(1)
-    
-    test_audit_logging()
     
     # Print summary
     all_passed = print_summary()
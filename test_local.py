@@ -8,6 +8,9 @@ import requests
 import json
 import sys
 
+# Shared HTTP session so checks reuse one keep-alive connection
+SESSION = requests.Session()
+
 def test_local_setup():
     """Test if services are running locally"""
     
@@ -18,7 +21,7 @@ def test_local_setup():
     
     # 1. Check if backend is running
     try:
-        response = requests.get(f"{BASE_URL}/health", timeout=5)
+        response = SESSION.get(f"{BASE_URL}/health", timeout=5)
         if response.status_code == 200:
             print("✅ Backend is running")
             health_data = response.json()
@@ -54,7 +57,7 @@ def test_local_setup():
             "temperature": 0.1
         }
         
-        response = requests.post(f"{BASE_URL}/chat", json=payload, timeout=30)
+        response = SESSION.post(f"{BASE_URL}/chat", json=payload, timeout=30)
         
         if response.status_code == 200:
             data = response.json()
@@ -3,20 +3,44 @@ HIPAA-compliant browser automation tool
 Requires explicit user confirmation before executing actions
 """
 
+import re
 import logging
 import asyncio
-from typing import Dict, List, Optional, Any
+from typing import Callable, Dict, List, Optional, Any
 from datetime import datetime
 import hashlib
-import json
+from string import Template
+from types import MappingProxyType
+
+from cachetools import TTLCache
 
 logger = logging.getLogger(__name__)
 
 # Action types that require confirmation
-SENSITIVE_ACTIONS = [
+SENSITIVE_ACTIONS = frozenset({
     "login", "submit_form", "download", "upload",
     "click_submit", "enter_password", "enter_credentials"
-]
+})
+
+# URL schemes that can execute or smuggle content in the browser
+_SUSPICIOUS_URL = re.compile(r"(?:javascript|data|file|vbscript|blob):", re.IGNORECASE)
+
+# Targets that suggest sensitive data entry
+_SENSITIVE_TARGET = re.compile(r"password|ssn|credit", re.IGNORECASE)
+
+# Human-readable descriptions per action type (text content is never exposed)
+_ACTION_DESCRIBERS: Dict[str, Callable[[Dict], str]] = {
+    "navigate": lambda a: f"Navigate to {a.get('url', 'URL')}",
+    "click": lambda a: f"Click on {a.get('target', 'element')}",
+    "type": lambda a: f"Enter text in {a.get('target', 'element')}",
+    "screenshot": lambda a: "Take screenshot",
+    "wait": lambda a: f"Wait for {a.get('seconds', 1)} seconds",
+    "login": lambda a: f"Log into {a.get('site', 'website')}",
+    "download": lambda a: f"Download {a.get('file', 'file')}",
+}
+
+def _describe_other(action: Dict) -> str:
+    return f"Perform {action.get('type', 'unknown')} on {action.get('target', 'element')}"
 
 class BrowserActionController:
     """
@@ -24,9 +48,11 @@ class BrowserActionController:
     """
     
     def __init__(self):
-        self.pending_actions = {}
         self.executed_actions = []
         self.confirmation_timeout = 300  # 5 minutes
+        self.simulate_delay_s = 0.0  # Per-action delay for the execution stub
+        # Unconfirmed plans expire after the timeout and the store is bounded
+        self.pending_actions = TTLCache(maxsize=10_000, ttl=self.confirmation_timeout)
     
     def create_action_plan(self, actions: List[Dict]) -> Dict:
         """
@@ -39,9 +65,10 @@ class BrowserActionController:
             Action plan with unique ID for confirmation
         """
         # Generate unique plan ID
-        plan_id = hashlib.md5(
-            f"{datetime.utcnow().isoformat()}_{len(actions)}".encode()
-        ).hexdigest()[:12]
+        plan_id = hashlib.blake2b(
+            f"{datetime.utcnow().isoformat()}_{len(actions)}".encode(),
+            digest_size=6
+        ).hexdigest()
         
         # Analyze actions for sensitivity
         requires_confirmation = any(
@@ -71,33 +98,10 @@ class BrowserActionController:
         """
         Generate human-readable description of action plan
         """
-        descriptions = []
-        
-        for i, action in enumerate(actions, 1):
-            action_type = action.get("type", "unknown")
-            target = action.get("target", "element")
-            
-            if action_type == "navigate":
-                desc = f"Navigate to {action.get('url', 'URL')}"
-            elif action_type == "click":
-                desc = f"Click on {target}"
-            elif action_type == "type":
-                # Don't expose actual text content for security
-                desc = f"Enter text in {target}"
-            elif action_type == "screenshot":
-                desc = f"Take screenshot"
-            elif action_type == "wait":
-                desc = f"Wait for {action.get('seconds', 1)} seconds"
-            elif action_type == "login":
-                desc = f"Log into {action.get('site', 'website')}"
-            elif action_type == "download":
-                desc = f"Download {action.get('file', 'file')}"
-            else:
-                desc = f"Perform {action_type} on {target}"
-            
-            descriptions.append(f"{i}. {desc}")
-        
-        return "\n".join(descriptions)
+        return "\n".join(
+            f"{i}. {_ACTION_DESCRIBERS.get(action.get('type'), _describe_other)(action)}"
+            for i, action in enumerate(actions, 1)
+        )
     
     async def confirm_action(self, plan_id: str, user_confirmation: str) -> Dict:
         """
@@ -110,15 +114,14 @@ class BrowserActionController:
         Returns:
             Confirmation result
         """
-        if plan_id not in self.pending_actions:
+        plan = self.pending_actions.get(plan_id)
+        if plan is None:
             return {
                 "success": False,
                 "error": "Plan not found or already executed",
                 "plan_id": plan_id
             }
         
-        plan = self.pending_actions[plan_id]
-        
         # Check if confirmation is valid
         if user_confirmation.upper() in ["CONFIRM", "YES", "PROCEED"]:
             plan["status"] = "confirmed"
@@ -127,8 +130,8 @@ class BrowserActionController:
             # Move to execution
             result = await self._execute_plan(plan)
             
-            # Clean up
-            del self.pending_actions[plan_id]
+            # Clean up (the plan may have expired while executing)
+            self.pending_actions.pop(plan_id, None)
             
             return {
                 "success": True,
@@ -139,7 +142,7 @@ class BrowserActionController:
         else:
             # Cancellation
             plan["status"] = "cancelled"
-            del self.pending_actions[plan_id]
+            self.pending_actions.pop(plan_id, None)
             
             return {
                 "success": False,
@@ -156,41 +159,48 @@ class BrowserActionController:
         """
         execution_log = []
         screenshots = []
+        _now = datetime.utcnow
+        plan_id = plan["plan_id"]
         
         try:
             # In production, use Playwright here
             # from playwright.async_api import async_playwright
             
-            for i, action in enumerate(plan["actions"]):
+            for step, action in enumerate(plan["actions"], 1):
+                a_type = action["type"]
+                # One timestamp per step, shared by its log entry and screenshot
+                step_ts = _now().isoformat()
+                
                 # Stub execution
                 log_entry = {
-                    "step": i + 1,
-                    "action": action["type"],
+                    "step": step,
+                    "action": a_type,
                     "target": action.get("target"),
-                    "timestamp": datetime.utcnow().isoformat(),
+                    "timestamp": step_ts,
                     "status": "completed"
                 }
                 
                 # Simulate action execution
-                await asyncio.sleep(0.1)
+                if self.simulate_delay_s:
+                    await asyncio.sleep(self.simulate_delay_s)
                 
                 # Log without PHI
-                logger.info(f"Executed action: {action['type']} on step {i+1}")
+                logger.info(f"Executed action: {a_type} on step {step}")
                 
                 execution_log.append(log_entry)
                 
                 # If screenshot action, add placeholder
-                if action["type"] == "screenshot":
+                if a_type == "screenshot":
                     screenshots.append({
-                        "step": i + 1,
-                        "filename": f"screenshot_{plan['plan_id']}_{i+1}.png",
-                        "timestamp": datetime.utcnow().isoformat()
+                        "step": step,
+                        "filename": f"screenshot_{plan_id}_{step}.png",
+                        "timestamp": step_ts
                     })
             
             # Record execution
             self.executed_actions.append({
-                "plan_id": plan["plan_id"],
-                "executed_at": datetime.utcnow().isoformat(),
+                "plan_id": plan_id,
+                "executed_at": _now().isoformat(),
                 "action_count": len(plan["actions"])
             })
             
@@ -198,7 +208,7 @@ class BrowserActionController:
                 "success": True,
                 "execution_log": execution_log,
                 "screenshots": screenshots,
-                "duration_ms": len(plan["actions"]) * 100  # Simulated
+                "duration_ms": round(len(plan["actions"]) * self.simulate_delay_s * 1000)  # Simulated
             }
             
         except Exception as e:
@@ -282,6 +292,12 @@ def validate_browser_actions(actions: List[Dict]) -> Dict:
         
         action_type = action["type"]
         
+        # Action types are looked up in sets and dicts, so they must be hashable strings
+        if not isinstance(action_type, str):
+            validation_result["valid"] = False
+            validation_result["error"] = f"Action {i+1} 'type' must be a string"
+            return validation_result
+        
         # Validate specific action types
         if action_type == "navigate":
             if "url" not in action:
@@ -290,8 +306,7 @@ def validate_browser_actions(actions: List[Dict]) -> Dict:
                 return validation_result
             
             # Check for suspicious URLs
-            url = action["url"]
-            if any(suspicious in url.lower() for suspicious in ["javascript:", "data:", "file:"]):
+            if _SUSPICIOUS_URL.search(action["url"]):
                 validation_result["valid"] = False
                 validation_result["error"] = f"Suspicious URL protocol in action {i+1}"
                 return validation_result
@@ -299,10 +314,9 @@ def validate_browser_actions(actions: List[Dict]) -> Dict:
         elif action_type in ["click", "type"]:
             if "target" not in action:
                 validation_result["warnings"].append(f"Action {i+1} missing 'target' selector")
-        
-        elif action_type == "type":
+            
             # Warn about sensitive data entry
-            if "password" in str(action.get("target", "")).lower():
+            elif action_type == "type" and _SENSITIVE_TARGET.search(str(action["target"])):
                 validation_result["warnings"].append(f"Action {i+1} may enter sensitive data")
         
         # Check for potentially dangerous actions
@@ -351,31 +365,61 @@ def format_browser_action_for_llm(action_result: Dict) -> str:
     
     return formatted
 
-# Example browser action templates
+# Example browser action templates (read-only; use instantiate_action_template)
 BROWSER_ACTION_TEMPLATES = {
-    "login": [
-        {"type": "navigate", "url": "{login_url}"},
-        {"type": "wait", "seconds": 2},
-        {"type": "type", "target": "#username", "text": "{username}"},
-        {"type": "type", "target": "#password", "text": "{password}"},
-        {"type": "click", "target": "#login-button"},
-        {"type": "wait", "seconds": 3}
-    ],
-    "download_report": [
-        {"type": "navigate", "url": "{reports_url}"},
-        {"type": "wait", "seconds": 2},
-        {"type": "click", "target": ".report-link"},
-        {"type": "wait", "seconds": 1},
-        {"type": "click", "target": "#download-button"},
-        {"type": "wait", "seconds": 5}
-    ],
-    "fill_form": [
-        {"type": "navigate", "url": "{form_url}"},
-        {"type": "wait", "seconds": 2},
-        {"type": "type", "target": "#field1", "text": "{value1}"},
-        {"type": "type", "target": "#field2", "text": "{value2}"},
-        {"type": "click", "target": "#submit"},
-        {"type": "wait", "seconds": 3},
-        {"type": "screenshot"}
+    name: tuple(MappingProxyType(action) for action in actions)
+    for name, actions in {
+        "login": [
+            {"type": "navigate", "url": "${login_url}"},
+            {"type": "wait", "seconds": 2},
+            {"type": "type", "target": "#username", "text": "${username}"},
+            {"type": "type", "target": "#password", "text": "${password}"},
+            {"type": "click", "target": "#login-button"},
+            {"type": "wait", "seconds": 3}
+        ],
+        "download_report": [
+            {"type": "navigate", "url": "${reports_url}"},
+            {"type": "wait", "seconds": 2},
+            {"type": "click", "target": ".report-link"},
+            {"type": "wait", "seconds": 1},
+            {"type": "click", "target": "#download-button"},
+            {"type": "wait", "seconds": 5}
+        ],
+        "fill_form": [
+            {"type": "navigate", "url": "${form_url}"},
+            {"type": "wait", "seconds": 2},
+            {"type": "type", "target": "#field1", "text": "${value1}"},
+            {"type": "type", "target": "#field2", "text": "${value2}"},
+            {"type": "click", "target": "#submit"},
+            {"type": "wait", "seconds": 3},
+            {"type": "screenshot"}
+        ]
+    }.items()
+}
+
+# Placeholder fields compiled once per template
+_COMPILED_TEMPLATES = {
+    name: tuple(
+        tuple(
+            (key, Template(value) if isinstance(value, str) and "$" in value else value)
+            for key, value in action.items()
+        )
+        for action in actions
+    )
+    for name, actions in BROWSER_ACTION_TEMPLATES.items()
+}
+
+def instantiate_action_template(name: str, values: Dict[str, Any]) -> List[Dict]:
+    """
+    Build a fresh action list from a named template
+    
+    Raises:
+        KeyError: If the template or one of its placeholder values is missing
+    """
+    return [
+        {
+            key: value.substitute(values) if isinstance(value, Template) else value
+            for key, value in action
+        }
+        for action in _COMPILED_TEMPLATES[name]
     ]
-}
\ No newline at end of file
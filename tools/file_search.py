@@ -4,15 +4,103 @@ Safe for PHI as it operates within the compliant boundary
 """
 
 import os
+import re
+import sys
 import json
 import logging
 from typing import List, Dict, Optional
 from datetime import datetime
 import hashlib
 import asyncio
+import mmap
+from collections import Counter, defaultdict
+from functools import lru_cache
+from itertools import chain
+
+try:
+    import numpy as np
+    from numba import njit
+except ImportError:  # Optional accelerator; Counter scoring is used instead
+    np = None
+    njit = None
 
 logger = logging.getLogger(__name__)
 
+def _vbyte_encode(value: int, out: bytearray):
+    """
+    Append a non-negative int as a varbyte: 7 bits per byte, low bits first,
+    high bit set on every byte except the last
+    """
+    while value >= 0x80:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+def _vbyte_decode_gaps(buf: bytes):
+    """
+    Decode delta-gap varbyte postings back into ascending doc numbers
+    """
+    doc_number = 0
+    gap = 0
+    shift = 0
+    for byte in buf:
+        gap |= (byte & 0x7F) << shift
+        if byte & 0x80:
+            shift += 7
+            continue
+        doc_number += gap
+        yield doc_number
+        gap = 0
+        shift = 0
+
+# Same tokens as str.split(), but yielded one at a time
+_TOKEN_RE = re.compile(r'\S+')
+
+@lru_cache(maxsize=256)
+def _snippet_pattern(query_words: frozenset) -> "re.Pattern":
+    """
+    Compile one alternation of the query words; its leftmost match is the
+    first occurrence of any of them
+    """
+    return re.compile("|".join(map(re.escape, query_words)))
+
+if njit is not None:
+    @njit(cache=True)
+    def _score_postings(query_token_ids, postings_flat, postings_offsets, n_docs):
+        """
+        Count matching query words per document, decoding delta-gap varbyte
+        postings straight out of the packed byte buffer
+        
+        Also returns the order in which each document was first hit, which is
+        the insertion order Counter.most_common uses to break ties.
+        """
+        scores = np.zeros(n_docs, np.int32)
+        first_seen = np.zeros(n_docs, np.int64)
+        seen_count = 0
+        for token_id in query_token_ids:
+            doc_number = 0
+            gap = 0
+            shift = 0
+            for i in range(postings_offsets[token_id], postings_offsets[token_id + 1]):
+                byte = postings_flat[i]
+                gap |= (byte & 0x7F) << shift
+                if byte & 0x80:
+                    shift += 7
+                else:
+                    doc_number += gap
+                    if scores[doc_number] == 0:
+                        first_seen[doc_number] = seen_count
+                        seen_count += 1
+                    scores[doc_number] += 1
+                    gap = 0
+                    shift = 0
+        return scores, first_seen
+    
+    # Compile at import so the first search doesn't pay the JIT cost
+    _score_postings(np.zeros(1, np.int64), np.zeros(1, np.uint8), np.array([0, 1], np.int64), 1)
+else:
+    _score_postings = None
+
 # In production, use a proper vector database like Pinecone, Weaviate, or pgvector
 # For now, we'll use a simple in-memory index
 class InternalDocumentStore:
@@ -23,10 +111,28 @@ class InternalDocumentStore:
     
     def __init__(self):
         self.documents = {}
-        self.index = {}
+        # Documents are numbered in insertion order; re-adding a doc_id gives it
+        # a new number and leaves None at the old one so stale postings are
+        # skipped. Once dead numbers outnumber live documents, the postings
+        # are rebuilt without them.
+        self.doc_ids: List[Optional[str]] = []
+        self._dead_count = 0
+        self.doc_numbers: Dict[str, int] = {}
+        # word -> ascending doc numbers, delta-gap varbyte encoded
+        self.postings_bytes = defaultdict(bytearray)
+        self.postings_last: Dict[str, int] = {}
+        self._postings = None  # Packed snapshot of the index for the numba scorer
+        # Kept apart from the document records so searches only read those
+        self.access_counts: Counter = Counter()
         self.encryption_key = os.getenv("DOCUMENT_ENCRYPTION_KEY", "development-key")
     
-    def add_document(self, doc_id: str, content: str, metadata: Dict = None) -> str:
+    def add_document(
+        self,
+        doc_id: str,
+        content: str,
+        metadata: Dict = None,
+        doc_hash: Optional[str] = None
+    ) -> str:
         """
         Add a document to the internal store
         
@@ -34,83 +140,207 @@ class InternalDocumentStore:
             doc_id: Unique document identifier
             content: Document content (may contain PHI)
             metadata: Additional metadata (title, date, category, etc.)
+            doc_hash: SHA-256 hex digest of content's UTF-8 encoding, if the
+                caller already computed it
         
         Returns:
             Document hash for verification
         """
         # Generate document hash for integrity
-        doc_hash = hashlib.sha256(content.encode()).hexdigest()
+        if doc_hash is None:
+            doc_hash = hashlib.sha256(content.encode()).hexdigest()
+        
+        # Lowercased once here and reused by indexing and every snippet
+        content_lower = content.lower()
         
         # Store document (in production, encrypt before storing)
         self.documents[doc_id] = {
             "content": content,
+            "content_lower": content_lower,
             "metadata": metadata or {},
             "hash": doc_hash,
-            "indexed_at": datetime.utcnow().isoformat(),
-            "access_count": 0
+            "indexed_at": datetime.utcnow().isoformat()
         }
+        self.access_counts.pop(doc_id, None)
         
         # Update simple word index (in production, use proper NLP/embedding)
-        words = content.lower().split()
-        for word in set(words):
-            if word not in self.index:
-                self.index[word] = []
-            if doc_id not in self.index[word]:
-                self.index[word].append(doc_id)
+        previous = self.doc_numbers.pop(doc_id, None)
+        if previous is not None:
+            self.doc_ids[previous] = None
+            self._dead_count += 1
+        
+        if self._dead_count > len(self.documents):
+            self._compact()
+        else:
+            self._index_tokens(doc_id, content_lower)
+        self._postings = None
         
         logger.info(f"Document added: {doc_id}, hash={doc_hash[:8]}...")
         return doc_hash
     
+    def _index_tokens(self, doc_id: str, content_lower: str):
+        """
+        Give a document the next doc number and append it to its words' postings
+        """
+        doc_number = len(self.doc_ids)
+        self.doc_ids.append(doc_id)
+        self.doc_numbers[doc_id] = doc_number
+        
+        # Stream tokens and skip repeats, rather than materializing the full
+        # split() list plus a set of it for large documents
+        postings_last = self.postings_last
+        seen = set()
+        for match in _TOKEN_RE.finditer(content_lower):
+            # Interned so every posting key for a word is one shared object
+            word = sys.intern(match.group())
+            if word in seen:
+                continue
+            seen.add(word)
+            _vbyte_encode(doc_number - postings_last.get(word, 0), self.postings_bytes[word])
+            postings_last[word] = doc_number
+    
+    def _compact(self):
+        """
+        Rebuild the postings from the stored documents, dropping dead doc
+        numbers and renumbering live documents in their current order
+        """
+        # The document being re-added has no number yet, so it sorts last
+        live_doc_ids = sorted(
+            self.documents, key=lambda doc_id: self.doc_numbers.get(doc_id, len(self.doc_ids))
+        )
+        self.doc_ids = []
+        self.doc_numbers = {}
+        self.postings_bytes = defaultdict(bytearray)
+        self.postings_last = {}
+        self._dead_count = 0
+        
+        for doc_id in live_doc_ids:
+            self._index_tokens(doc_id, self.documents[doc_id]["content_lower"])
+        
+        logger.info(f"Document index compacted: documents={len(live_doc_ids)}")
+    
     def search(self, query: str, limit: int = 10) -> List[Dict]:
         """
         Search documents internally (PHI-safe)
         """
-        query_words = query.lower().split()
-        doc_scores = {}
+        # Interned query words hit the identity fast path on index key compares
+        query_words = [sys.intern(word) for word in query.lower().split()]
         
-        # Simple TF-IDF style scoring
-        for word in query_words:
-            if word in self.index:
-                for doc_id in self.index[word]:
-                    if doc_id not in doc_scores:
-                        doc_scores[doc_id] = 0
-                    doc_scores[doc_id] += 1
+        # Simple TF-IDF style scoring: one point per matching query word,
+        # top results by relevance score
+        if _score_postings is not None:
+            sorted_docs = self._top_docs_numba(query_words, limit)
+        else:
+            sorted_docs = self._top_docs(query_words, limit)
         
-        # Sort by relevance score
-        sorted_docs = sorted(doc_scores.items(), key=lambda x: x[1], reverse=True)[:limit]
+        # One timestamp for every result of this search
+        accessed_at = datetime.utcnow().isoformat()
         
         results = []
         for doc_id, score in sorted_docs:
             doc = self.documents[doc_id]
-            doc["access_count"] += 1
             
             # Extract snippet around matched terms
-            content = doc["content"]
-            snippet = self._extract_snippet(content, query_words)
+            snippet = self._extract_snippet(doc["content"], query_words, content_lower=doc["content_lower"])
             
             results.append({
                 "doc_id": doc_id,
                 "score": score,
                 "snippet": snippet,
                 "metadata": doc["metadata"],
-                "accessed_at": datetime.utcnow().isoformat()
+                "accessed_at": accessed_at
             })
         
+        self.access_counts.update(doc_id for doc_id, _ in sorted_docs)
+        
         logger.info(f"Internal search completed: query_words={len(query_words)}, results={len(results)}")
         return results
     
-    def _extract_snippet(self, content: str, query_words: List[str], context_size: int = 50) -> str:
+    def _top_docs(self, query_words: List[str], limit: int) -> List[tuple]:
+        """
+        Score by decoding postings in Python and return the top (doc_id, score) pairs
+        """
+        doc_ids = self.doc_ids
+        # .get() so lookups of unknown words don't grow the defaultdict
+        doc_scores = Counter(
+            doc_number
+            for doc_number in chain.from_iterable(
+                _vbyte_decode_gaps(self.postings_bytes.get(word, b"")) for word in query_words
+            )
+            if doc_ids[doc_number] is not None
+        )
+        return [(doc_ids[n], score) for n, score in doc_scores.most_common(limit)]
+    
+    def _build_postings(self):
+        """
+        Pack every word's varbyte postings back to back into one uint8 buffer,
+        with int64 byte offsets per token id
+        """
+        token_ids = {}
+        postings_offsets = [0]
+        
+        for word, postings in self.postings_bytes.items():
+            token_ids[word] = len(token_ids)
+            postings_offsets.append(postings_offsets[-1] + len(postings))
+        
+        dead = [n for n, doc_id in enumerate(self.doc_ids) if doc_id is None]
+        self._postings = (
+            token_ids,
+            np.frombuffer(b"".join(self.postings_bytes.values()), dtype=np.uint8),
+            np.asarray(postings_offsets, dtype=np.int64),
+            np.asarray(dead, dtype=np.int64)
+        )
+    
+    def _top_docs_numba(self, query_words: List[str], limit: int) -> List[tuple]:
+        """
+        Score with the numba kernel and return the top (doc_id, score) pairs
+        """
+        if self._postings is None:
+            self._build_postings()
+        token_ids, postings_flat, postings_offsets, dead = self._postings
+        
+        query_token_ids = np.asarray(
+            [token_ids[word] for word in query_words if word in token_ids], dtype=np.int64
+        )
+        if limit <= 0 or not len(query_token_ids):
+            return []
+        
+        scores, first_seen = _score_postings(
+            query_token_ids, postings_flat, postings_offsets, len(self.doc_ids)
+        )
+        scores[dead] = 0
+        hits = np.flatnonzero(scores)
+        
+        # Highest score first; ties by first hit, matching Counter.most_common.
+        # first_seen < n_docs, so one int64 key orders by both
+        hit_scores = scores[hits]
+        key = hit_scores.astype(np.int64) * len(self.doc_ids) - first_seen[hits]
+        if len(hits) > limit:
+            top = np.argpartition(key, -limit)[-limit:]
+        else:
+            top = np.arange(len(hits))
+        top = top[np.argsort(-key[top])]
+        return [(self.doc_ids[n], score) for n, score in zip(hits[top].tolist(), hit_scores[top].tolist())]
+    
+    def _extract_snippet(
+        self,
+        content: str,
+        query_words: List[str],
+        context_size: int = 50,
+        content_lower: Optional[str] = None
+    ) -> str:
         """
         Extract relevant snippet from document
         """
-        content_lower = content.lower()
+        if content_lower is None:
+            content_lower = content.lower()
         
-        # Find first occurrence of any query word
+        # Find first occurrence of any query word in a single scan
         first_pos = len(content)
-        for word in query_words:
-            pos = content_lower.find(word)
-            if pos != -1 and pos < first_pos:
-                first_pos = pos
+        if query_words:
+            match = _snippet_pattern(frozenset(query_words)).search(content_lower)
+            if match:
+                first_pos = match.start()
         
         # Extract snippet with context
         start = max(0, first_pos - context_size)
@@ -177,6 +407,89 @@ async def search_internal_documents(
     
     return response
 
+# Files are hashed from their mapping in chunks of this size
+HASH_CHUNK_SIZE = 1 << 20
+
+def _read_file_mapped(file_path: str) -> tuple:
+    """
+    Memory-map a file, hash it in chunks and decode it once, so the file is
+    never copied into an intermediate bytes object
+    
+    Returns:
+        Tuple of (content, doc_hash, file_size)
+    """
+    with open(file_path, 'rb') as f:
+        file_size = os.fstat(f.fileno()).st_size
+        if not file_size:
+            # Empty files can't be mapped
+            return "", hashlib.sha256().hexdigest(), 0
+        
+        digest = hashlib.sha256()
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            with memoryview(mapped) as view:
+                for offset in range(0, len(view), HASH_CHUNK_SIZE):
+                    digest.update(view[offset:offset + HASH_CHUNK_SIZE])
+                content = str(view, 'utf-8')
+    
+    return content, digest.hexdigest(), file_size
+
+async def _read_document(
+    file_path: str,
+    doc_type: str,
+    metadata: Optional[Dict],
+    indexed_date: Optional[str] = None
+) -> tuple:
+    """
+    Read a document file and build its index metadata
+    
+    Returns:
+        Tuple of (doc_id, content, metadata, doc_hash)
+    """
+    # Map, hash and decode in a worker thread so the event loop isn't blocked
+    content, doc_hash, file_size = await asyncio.to_thread(_read_file_mapped, file_path)
+    
+    # Generate document ID
+    doc_id = os.path.basename(file_path)
+    
+    # Add metadata
+    if metadata is None:
+        metadata = {}
+    metadata.update({
+        "file_path": file_path,
+        "doc_type": doc_type,
+        "file_size": file_size,
+        "indexed_date": indexed_date or datetime.utcnow().isoformat()
+    })
+    
+    return doc_id, content, metadata, doc_hash
+
+def _index_failure(e: BaseException) -> Dict:
+    """
+    Indexing result for a document that could not be read or added
+    """
+    logger.error(f"Failed to index document: {type(e).__name__}")
+    return {
+        "success": False,
+        "error": str(type(e).__name__),
+        "doc_id": None
+    }
+
+def _add_read_document(doc_id: str, content: str, metadata: Dict, doc_hash: str) -> Dict:
+    """
+    Add a document read by _read_document to the store
+    """
+    try:
+        doc_hash = document_store.add_document(doc_id, content, metadata, doc_hash)
+    except Exception as e:
+        return _index_failure(e)
+    
+    return {
+        "success": True,
+        "doc_id": doc_id,
+        "doc_hash": doc_hash,
+        "metadata": metadata
+    }
+
 async def index_document(
     file_path: str,
     doc_type: str = "text",
@@ -193,42 +506,44 @@ async def index_document(
     Returns:
         Indexing result with document hash
     """
-    
     try:
-        # Read document content
-        with open(file_path, 'r', encoding='utf-8') as f:
-            content = f.read()
-        
-        # Generate document ID
-        doc_id = os.path.basename(file_path)
-        
-        # Add metadata
-        if metadata is None:
-            metadata = {}
-        metadata.update({
-            "file_path": file_path,
-            "doc_type": doc_type,
-            "file_size": os.path.getsize(file_path),
-            "indexed_date": datetime.utcnow().isoformat()
-        })
-        
-        # Index document
-        doc_hash = document_store.add_document(doc_id, content, metadata)
-        
-        return {
-            "success": True,
-            "doc_id": doc_id,
-            "doc_hash": doc_hash,
-            "metadata": metadata
-        }
-        
+        read = await _read_document(file_path, doc_type, metadata)
     except Exception as e:
-        logger.error(f"Failed to index document: {type(e).__name__}")
-        return {
-            "success": False,
-            "error": str(type(e).__name__),
-            "doc_id": None
-        }
+        return _index_failure(e)
+    
+    return _add_read_document(*read)
+
+async def index_documents(
+    file_paths: List[str],
+    doc_type: str = "text",
+    concurrency: int = 16
+) -> List[Dict]:
+    """
+    Index a batch of documents, reading up to `concurrency` files at once
+    
+    Args:
+        file_paths: Paths to document files
+        doc_type: Type of the documents (text, pdf, etc.)
+        concurrency: Maximum number of files read concurrently
+    
+    Returns:
+        Indexing results in the same order as file_paths
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    # One timestamp for the whole batch
+    indexed_date = datetime.utcnow().isoformat()
+    
+    async def read_one(file_path: str) -> tuple:
+        async with semaphore:
+            return await _read_document(file_path, doc_type, None, indexed_date)
+    
+    reads = await asyncio.gather(*map(read_one, file_paths), return_exceptions=True)
+    
+    # Update the store in one pass once every read has finished
+    return [
+        _index_failure(read) if isinstance(read, BaseException) else _add_read_document(*read)
+        for read in reads
+    ]
 
 def format_file_search_results_for_llm(results: Dict) -> str:
     """
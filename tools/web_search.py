@@ -5,9 +5,17 @@ Ensures PHI is redacted before any external API calls
 
 import re
 import logging
-from typing import List, Dict, Optional
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import List, Dict, Optional, Tuple
 import asyncio
 
+try:
+    import hyperscan
+except ImportError:  # Optional accelerator; the fused re pattern is used instead
+    hyperscan = None
+
 logger = logging.getLogger(__name__)
 
 # PHI patterns to redact
@@ -21,39 +29,161 @@ PHI_PATTERNS = {
     'zip': r'\b\d{5}(?:-\d{4})?\b',
 }
 
-def redact_phi(text: str) -> tuple[str, List[str]]:
+# Only these patterns contain letters; the others are digits and punctuation,
+# where case folding would be wasted work
+_CASELESS_PHI_TYPES = frozenset({'email', 'mrn', 'address'})
+
+# Potential names (simple heuristic - words following Mr/Mrs/Dr/etc)
+TITLE_PATTERN = r'(?:Mr|Mrs|Ms|Dr|Prof)\.?\s+'
+NAME_PATTERN = r'\b' + TITLE_PATTERN + r'(?P<name>[A-Z][a-z]+(?:\s+[A-Z][a-z]+)*)'
+_TITLE_RE = re.compile(TITLE_PATTERN)
+
+# All PHI patterns fused into one alternation, compiled once at import, so
+# redaction is a single left-to-right scan. Letter-bearing PHI patterns are
+# case-insensitive; the name heuristic relies on capitalization.
+_PHI_RE = re.compile("|".join(
+    [
+        f"(?P<{phi_type}>(?i:{pattern}))" if phi_type in _CASELESS_PHI_TYPES
+        else f"(?P<{phi_type}>{pattern})"
+        for phi_type, pattern in PHI_PATTERNS.items()
+    ]
+    + [NAME_PATTERN]
+))
+
+def _compile_hyperscan_db():
     """
-    Redact PHI from text before external API calls
+    Compile PHI and name patterns into one Hyperscan block-mode database,
+    used as a prefilter in front of the fused re pattern
+    
+    Returns None when hyperscan is not installed or rejects a pattern.
+    """
+    if hyperscan is None:
+        return None
+    
+    # Hyperscan has no capture groups; it only has to say whether anything matches
+    expressions = [pattern.encode() for pattern in PHI_PATTERNS.values()]
+    expressions.append(NAME_PATTERN.replace('?P<name>', '?:').encode())
+    flags = [
+        hyperscan.HS_FLAG_CASELESS if phi_type in _CASELESS_PHI_TYPES else 0
+        for phi_type in PHI_PATTERNS
+    ]
+    flags.append(0)
+    
+    try:
+        database = hyperscan.Database()
+        database.compile(
+            expressions=expressions,
+            ids=list(range(len(expressions))),
+            elements=len(expressions),
+            flags=flags
+        )
+    except hyperscan.error as e:
+        logger.warning(f"Hyperscan unavailable for PHI redaction, using re: {e}")
+        return None
+    return database
+
+_HS_DATABASE = _compile_hyperscan_db()
+
+# Hyperscan scratch space is per thread
+_hs_local = threading.local()
+
+# ASCII separators that Python's \s matches but Hyperscan's does not; text
+# containing them must go to re or the prefilter could miss PHI
+_HS_UNSAFE_CHARS = re.compile(r'[\x1c-\x1f]')
+
+def _re_spans(text: str) -> List[Tuple[int, int, str]]:
+    """
+    Return (start, end, phi_type) spans found by the fused re pattern
+    """
+    return [(match.start(), match.end(), match.lastgroup) for match in _PHI_RE.finditer(text)]
+
+def _hyperscan_may_match(text: str) -> bool:
+    """
+    Scan ASCII text with Hyperscan, stopping at the first match of any pattern
+    
+    For ASCII text without \x1c-\x1f (see _HS_UNSAFE_CHARS), \s, \w, \d and
+    \b behave as in re, so every re match is also a match here and False
+    means the re pattern would find nothing either.
+    """
+    scratch = getattr(_hs_local, 'scratch', None)
+    if scratch is None:
+        scratch = _hs_local.scratch = hyperscan.Scratch(_HS_DATABASE)
+    
+    try:
+        # Returning True from the handler terminates the scan
+        _HS_DATABASE.scan(
+            text.encode('ascii'),
+            match_event_handler=lambda *match: True,
+            scratch=scratch
+        )
+    except hyperscan.ScanTerminated:
+        return True
+    return False
+
+def _redact_spans(text: str, spans: List[Tuple[int, int, str]]) -> tuple[str, List[Dict], List[str]]:
+    """
+    Splice placeholders over sorted, non-overlapping spans in one pass
     
     Returns:
-        Tuple of (redacted_text, list_of_redacted_items)
+        Tuple of (redacted_text, list_of_redacted_items, names)
     """
     redacted_items = []
-    redacted_text = text
-    
-    # Apply each PHI pattern
-    for phi_type, pattern in PHI_PATTERNS.items():
-        matches = re.finditer(pattern, redacted_text, re.IGNORECASE)
-        for match in matches:
-            original = match.group()
-            redacted_items.append({
-                'type': phi_type,
-                'original': original,
-                'position': match.span()
-            })
-            # Replace with generic placeholder
-            redacted_text = redacted_text.replace(original, f"[REDACTED_{phi_type.upper()}]")
-    
-    # Redact potential names (simple heuristic - words following Mr/Mrs/Dr/etc)
-    name_pattern = r'\b(?:Mr|Mrs|Ms|Dr|Prof)\.?\s+([A-Z][a-z]+(?:\s+[A-Z][a-z]+)*)'
-    for match in re.finditer(name_pattern, redacted_text):
-        name = match.group(1)
+    names = []
+    parts = []
+    pos = 0
+    
+    for start, end, phi_type in spans:
+        if phi_type == 'name':
+            # Keep the title, replace only the name itself
+            start = _TITLE_RE.match(text, start).end()
+            names.append(text[start:end])
         redacted_items.append({
-            'type': 'name',
-            'original': name,
-            'position': match.span(1)
+            'type': phi_type,
+            'original': text[start:end],
+            'position': (start, end)
         })
-        redacted_text = redacted_text.replace(name, "[REDACTED_NAME]")
+        parts.append(text[pos:start])
+        parts.append(f"[REDACTED_{phi_type.upper()}]")
+        pos = end
+    
+    parts.append(text[pos:])
+    return "".join(parts), redacted_items, names
+
+def _redact_name_mentions(text: str, names: List[str]) -> str:
+    """
+    Redact later bare mentions of names first seen after a title
+    """
+    mentions = re.compile(
+        r'\b(?:' + "|".join(map(re.escape, sorted(set(names), key=len, reverse=True))) + r')\b'
+    )
+    return mentions.sub("[REDACTED_NAME]", text)
+
+def redact_phi(text: str) -> tuple[str, List[str]]:
+    """
+    Redact PHI from text before external API calls
+    
+    When Hyperscan is installed, ASCII text it finds no PHI in is returned
+    without running the fused re pattern; anything else is redacted by re, so
+    results don't depend on the optional package. re word boundaries and
+    digits are Unicode-aware and \s also covers \x1c-\x1f, so text with
+    non-ASCII or those separator characters always goes to re.
+    
+    Returns:
+        Tuple of (redacted_text, list_of_redacted_items)
+    """
+    if (
+        _HS_DATABASE is not None
+        and text.isascii()
+        and not _HS_UNSAFE_CHARS.search(text)
+        and not _hyperscan_may_match(text)
+    ):
+        return text, []
+    
+    spans = _re_spans(text)
+    redacted_text, redacted_items, names = _redact_spans(text, spans)
+    
+    if names:
+        redacted_text = _redact_name_mentions(redacted_text, names)
     
     # Log redaction summary (no PHI)
     if redacted_items:
@@ -61,10 +191,33 @@ def redact_phi(text: str) -> tuple[str, List[str]]:
     
     return redacted_text, redacted_items
 
+# Canned results for the "stub" search engine
+_STUB_RESULTS = (
+    {
+        "title": "Example Medical Information",
+        "url": "https://example.com/medical-info",
+        "snippet": "General medical information about the topic...",
+        "relevance_score": 0.95
+    },
+    {
+        "title": "Healthcare Best Practices",
+        "url": "https://example.com/best-practices",
+        "snippet": "Industry standards for healthcare delivery...",
+        "relevance_score": 0.87
+    },
+    {
+        "title": "Clinical Guidelines",
+        "url": "https://example.com/guidelines",
+        "snippet": "Evidence-based clinical guidelines for practitioners...",
+        "relevance_score": 0.82
+    }
+)
+
 async def search_with_phi_protection(
     query: str,
     max_results: int = 5,
-    search_engine: str = "stub"
+    search_engine: str = "stub",
+    redacted: Optional[tuple] = None
 ) -> Dict:
     """
     Perform web search with PHI protection
@@ -73,13 +226,14 @@ async def search_with_phi_protection(
         query: Search query potentially containing PHI
         max_results: Maximum number of results to return
         search_engine: Search provider to use
+        redacted: redact_phi(query) result, if the caller already has it
     
     Returns:
         Search results with citations
     """
     
     # Redact PHI from query
-    safe_query, redacted_items = redact_phi(query)
+    safe_query, redacted_items = redacted if redacted is not None else redact_phi(query)
     
     if redacted_items:
         logger.warning(f"PHI detected and redacted from search query")
@@ -88,30 +242,11 @@ async def search_with_phi_protection(
     # In production, integrate with actual search API (with BAA if handling PHI)
     
     if search_engine == "stub":
-        # Simulated search results
+        # Simulated search results (copied so callers can't alter the template)
         results = {
             "query": safe_query,
             "original_query_redacted": len(redacted_items) > 0,
-            "results": [
-                {
-                    "title": "Example Medical Information",
-                    "url": "https://example.com/medical-info",
-                    "snippet": "General medical information about the topic...",
-                    "relevance_score": 0.95
-                },
-                {
-                    "title": "Healthcare Best Practices",
-                    "url": "https://example.com/best-practices",
-                    "snippet": "Industry standards for healthcare delivery...",
-                    "relevance_score": 0.87
-                },
-                {
-                    "title": "Clinical Guidelines",
-                    "url": "https://example.com/guidelines",
-                    "snippet": "Evidence-based clinical guidelines for practitioners...",
-                    "relevance_score": 0.82
-                }
-            ][:max_results],
+            "results": [dict(result) for result in _STUB_RESULTS[:max_results]],
             "metadata": {
                 "search_engine": search_engine,
                 "phi_redacted": len(redacted_items) > 0,
@@ -125,37 +260,84 @@ async def search_with_phi_protection(
     
     return results
 
-async def validate_search_request(query: str) -> Dict:
+# Authentication material that must never go to an external search
+_SENSITIVE_QUERY_RE = re.compile(r'password|token|secret|key', re.IGNORECASE)
+
+# Validation results cached per query digest; raw queries may hold PHI and
+# are never kept
+VALIDATION_CACHE_SIZE = 1024
+_validation_cache: "OrderedDict[bytes, Tuple[bool, Tuple[str, ...], bool]]" = OrderedDict()
+
+def _validate_query(query: str, phi_count: Optional[int] = None) -> Tuple[bool, Tuple[str, ...], bool]:
     """
-    Validate search request for HIPAA compliance
+    Run the validation checks for a query
     
-    Returns validation status and any warnings
+    Args:
+        query: Search query
+        phi_count: Number of PHI items already found in query, if known
+    
+    Returns:
+        Tuple of (valid, warnings, requires_redaction)
     """
-    validation_result = {
-        "valid": True,
-        "warnings": [],
-        "requires_redaction": False
-    }
+    valid = True
+    warnings = []
     
     # Check for obvious PHI
-    _, redacted_items = redact_phi(query)
+    if phi_count is None:
+        phi_count = len(redact_phi(query)[1])
     
-    if redacted_items:
-        validation_result["requires_redaction"] = True
-        validation_result["warnings"].append(
-            f"Query contains {len(redacted_items)} potential PHI items that will be redacted"
+    if phi_count:
+        warnings.append(
+            f"Query contains {phi_count} potential PHI items that will be redacted"
         )
     
     # Check query length
     if len(query) > 1000:
-        validation_result["warnings"].append("Query is very long and may be truncated")
+        warnings.append("Query is very long and may be truncated")
     
     # Check for suspicious patterns
-    if re.search(r'password|token|secret|key', query, re.IGNORECASE):
-        validation_result["warnings"].append("Query may contain sensitive authentication data")
-        validation_result["valid"] = False
+    if _SENSITIVE_QUERY_RE.search(query):
+        warnings.append("Query may contain sensitive authentication data")
+        valid = False
+    
+    return valid, tuple(warnings), bool(phi_count)
+
+def _validate_query_cached(query: str) -> Tuple[bool, Tuple[str, ...], bool]:
+    """
+    _validate_query with a bounded LRU cache keyed on a BLAKE2b digest of the
+    query, since chat sessions repeat queries
+    """
+    key = hashlib.blake2b(query.encode(), digest_size=16).digest()
+    result = _validation_cache.get(key)
+    if result is not None:
+        _validation_cache.move_to_end(key)
+        return result
+    
+    result = _validate_query(query)
+    _validation_cache[key] = result
+    if len(_validation_cache) > VALIDATION_CACHE_SIZE:
+        _validation_cache.popitem(last=False)
+    return result
+
+async def validate_search_request(query: str, redacted: Optional[tuple] = None) -> Dict:
+    """
+    Validate search request for HIPAA compliance
+    
+    Pass the redact_phi(query) result as `redacted` to reuse it here and in
+    search_with_phi_protection instead of scanning the query twice.
+    
+    Returns validation status and any warnings
+    """
+    if redacted is not None:
+        valid, warnings, requires_redaction = _validate_query(query, len(redacted[1]))
+    else:
+        valid, warnings, requires_redaction = _validate_query_cached(query)
     
-    return validation_result
+    return {
+        "valid": valid,
+        "warnings": list(warnings),
+        "requires_redaction": requires_redaction
+    }
 
 def format_search_results_for_llm(results: Dict) -> str:
     """